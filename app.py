@@ -1,13 +1,39 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import raiseload
+import msgspec
+import orjson
 import os
 
 # --------------------------------------------------------------------------
 # Flask app configuration
 # --------------------------------------------------------------------------
 
+# naive datetimes are emitted without an offset, same as msgspec and isoformat()
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+class ORJSONProvider(JSONProvider):
+    """
+    JSON provider backed by orjson instead of the stdlib json module.
+    Datetimes are serialized natively.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 
 # SQLite database file in the current folder
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -15,14 +41,50 @@ DB_PATH = os.path.join(BASE_DIR, "cards.db")
 
 app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{DB_PATH}"
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# keep connections pooled so the PRAGMAs below are applied once per connection
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"pool_size": 10, "pool_pre_ping": True}
+
+# compress responses over 1 KB, preferring brotli/zstd when the client accepts them
+app.config["COMPRESS_ALGORITHM"] = ["br", "zstd", "gzip"]
+# streamed responses (/cards) can't use gzip, deflate is the fallback there
+app.config["COMPRESS_ALGORITHM_STREAMING"] = ["br", "zstd", "deflate"]
+app.config["COMPRESS_MIN_SIZE"] = 1024
 
 db = SQLAlchemy(app)
+Compress(app)
+
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Tune every new SQLite connection: WAL journal so readers don't block
+    on writers, and synchronous=NORMAL to avoid an fsync per commit.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-20000")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
 
 # --------------------------------------------------------------------------
 # Constants
 # --------------------------------------------------------------------------
 
-VALID_CARD_TYPES = {"flashcard", "summary", "quiz", "task", "usecase", "mindmap"}
+VALID_CARD_TYPES = frozenset({"flashcard", "summary", "quiz", "task", "usecase", "mindmap"})
+# precomputed once for error payloads
+ALLOWED_CARD_TYPES = tuple(sorted(VALID_CARD_TYPES))
+# the invalid card_type error never changes, so serialize it once
+INVALID_CARD_TYPE_RESPONSE = (
+    orjson.dumps({"error": "Invalid card_type", "allowed_types": ALLOWED_CARD_TYPES}),
+    400,
+    {"Content-Type": "application/json"},
+)
+
+# rows fetched per round when streaming large result sets
+STREAM_CHUNK_SIZE = 1000
 
 # --------------------------------------------------------------------------
 # Database models
@@ -33,20 +95,29 @@ class Topic(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False, unique=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(
+        db.DateTime,
+        default=db.func.current_timestamp(),
+        server_default=db.func.current_timestamp(),
+        nullable=False,
+    )
 
-    cards = db.relationship("Card", backref="topic", lazy=True)
+    cards = db.relationship("Card", back_populates="topic", lazy="select")
 
     def to_dict(self) -> dict:
         return {
             "id": self.id,
             "name": self.name,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "created_at": self.created_at,
         }
 
 
 class Card(db.Model):
     __tablename__ = "cards"
+    __table_args__ = (
+        # covers lookups by topic_id alone and by (topic_id, card_type)
+        db.Index("ix_cards_topic_type", "topic_id", "card_type"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     topic_id = db.Column(db.Integer, db.ForeignKey("topics.id"), nullable=False)
@@ -54,7 +125,14 @@ class Card(db.Model):
     card_type = db.Column(db.String(50), nullable=False)  # e.g. 'flashcard', 'summary'
     content = db.Column(db.Text, nullable=False)
 
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(
+        db.DateTime,
+        default=db.func.current_timestamp(),
+        server_default=db.func.current_timestamp(),
+        nullable=False,
+    )
+
+    topic = db.relationship("Topic", back_populates="cards")
 
     def to_dict(self) -> dict:
         return {
@@ -62,40 +140,57 @@ class Card(db.Model):
             "topic_id": self.topic_id,
             "card_type": self.card_type,
             "content": self.content,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "created_at": self.created_at,
         }
 
+
+class CardOut(msgspec.Struct):
+    """Flat card row for list responses, encoded by msgspec without a dict."""
+
+    id: int
+    topic_id: int
+    card_type: str
+    content: str
+    created_at: datetime
+
+
+CARD_JSON_ENCODER = msgspec.json.Encoder()
+
 # --------------------------------------------------------------------------
 # Dummy content generator (placeholder instead of OpenAI)
 # --------------------------------------------------------------------------
 
+CONTENT_TEMPLATES = {
+    "flashcard": "Q: What is %(topic)s?\nA: This is a simple explanation of %(topic)s.",
+    "summary": "Summary for %(topic)s: this is a short high-level summary.",
+    "quiz": "Quiz question about %(topic)s: write one key concept related to it.",
+    "task": "Task for %(topic)s: perform a small exercise that uses this topic in practice.",
+    "usecase": "Use case for %(topic)s: describe when and why you would use %(topic)s.",
+    "mindmap": "Mindmap structure for %(topic)s: main idea -> subtopic A, subtopic B, subtopic C.",
+}
+GENERIC_TEMPLATE = "Generic content for %(topic)s (type: %(card_type)s)."
+
+
 def generate_dummy_content(topic: str, card_type: str) -> str:
     """
     Simple placeholder generator for different card types.
     Later we will replace this with a real OpenAI call.
     """
-    if card_type == "flashcard":
-        return f"Q: What is {topic}?\nA: This is a simple explanation of {topic}."
-    elif card_type == "summary":
-        return f"Summary for {topic}: this is a short high-level summary."
-    elif card_type == "quiz":
-        return f"Quiz question about {topic}: write one key concept related to it."
-    elif card_type == "task":
-        return f"Task for {topic}: perform a small exercise that uses this topic in practice."
-    elif card_type == "usecase":
-        return f"Use case for {topic}: describe when and why you would use {topic}."
-    elif card_type == "mindmap":
-        return f"Mindmap structure for {topic}: main idea -> subtopic A, subtopic B, subtopic C."
-    else:
-        return f"Generic content for {topic} (type: {card_type})."
+    template = CONTENT_TEMPLATES.get(card_type, GENERIC_TEMPLATE)
+    return template % {"topic": topic, "card_type": card_type}
 
 # --------------------------------------------------------------------------
 # Simple health endpoint
 # --------------------------------------------------------------------------
 
+# serialized once; a fresh Response is still built per call since
+# Response objects are mutable and must not be shared between requests
+HEALTH_OK_BODY = orjson.dumps({"status": "ok"})
+
+
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({"status": "ok"}), 200
+    return Response(HEALTH_OK_BODY, status=200, mimetype="application/json")
 
 # --------------------------------------------------------------------------
 # Topics endpoints
@@ -103,7 +198,8 @@ def health():
 
 @app.route("/topics", methods=["GET"])
 def list_topics():
-    topics = Topic.query.all()
+    # raiseload guards against accidental per-row lazy loads (N+1) in to_dict
+    topics = Topic.query.options(raiseload("*")).all()
     data = [t.to_dict() for t in topics]
     return jsonify(data), 200
 
@@ -118,7 +214,7 @@ def create_topic():
         "formats": ["flashcard", "summary", "quiz"]
     }
     """
-    data = request.get_json()
+    data = request.get_json(cache=False)
 
     if not data or "topic" not in data:
         return jsonify({"error": "Missing 'topic' in request body"}), 400
@@ -132,66 +228,53 @@ def create_topic():
     if not isinstance(formats, list) or not formats:
         return jsonify({"error": "Formats must be a non-empty list"}), 400
 
-    # validate requested card types
-    for f in formats:
-        if f not in VALID_CARD_TYPES:
-            return jsonify({
-                "error": f"Invalid card_type in formats: '{f}'",
-                "allowed_types": list(VALID_CARD_TYPES),
-            }), 400
-
-    # Check if topic already exists
-    existing = Topic.query.filter_by(name=topic_name).first()
-    if existing:
-        return jsonify({"error": "Topic already exists"}), 409
+    # validate requested card types (one set check, report the first bad one)
+    if not VALID_CARD_TYPES.issuperset(formats):
+        bad = next(f for f in formats if f not in VALID_CARD_TYPES)
+        return jsonify({
+            "error": f"Invalid card_type in formats: '{bad}'",
+            "allowed_types": ALLOWED_CARD_TYPES,
+        }), 400
 
-    # Create the topic
+    # Create the topic; the unique constraint on name rejects duplicates,
+    # which saves a SELECT round trip on every successful create
     new_topic = Topic(name=topic_name)
     db.session.add(new_topic)
-    db.session.flush()  # so new_topic.id is available
-
-    created_cards = []
-
-    for card_type in formats:
-        content = generate_dummy_content(topic_name, card_type)
-        card = Card(
-            topic_id=new_topic.id,
-            card_type=card_type,
-            content=content,
-        )
-        db.session.add(card)
-        created_cards.append(card)
-
-    db.session.commit()
+    try:
+        db.session.flush()  # so new_topic.id is available
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "Topic already exists"}), 409
 
+    # one multi-row INSERT ... RETURNING for all cards instead of one per card
+    rows = db.session.execute(
+        db.insert(Card).returning(
+            Card.id,
+            Card.topic_id,
+            Card.card_type,
+            Card.content,
+            Card.created_at,
+        ),
+        [
+            {
+                "topic_id": new_topic.id,
+                "card_type": card_type,
+                "content": generate_dummy_content(topic_name, card_type),
+            }
+            for card_type in formats
+        ],
+    ).all()
+
+    # serialize before commit, which would expire new_topic and force a reload
     response = {
         "topic": new_topic.to_dict(),
-        "cards": [c.to_dict() for c in created_cards],
+        # RETURNING order isn't guaranteed for multi-row VALUES; ids follow input order
+        "cards": [row._asdict() for row in sorted(rows, key=lambda row: row.id)],
     }
-    return jsonify(response), 201
 
-@app.route("/topics/<int:topic_id>/cards", methods=["GET"])
-def list_topic_cards(topic_id: int):
-    """
-    Return all cards for a given topic.
-    Optional query param:
-    ?type=flashcard / summary / quiz / task / usecase / mindmap
-    """
-    # קודם בודקים שהנושא קיים
-    topic = Topic.query.get(topic_id)
-    if not topic:
-        return jsonify({"error": "Topic not found"}), 404
-
-    # אפשרות לפילטר לפי card_type
-    card_type = request.args.get("type")
-
-    if card_type:
-        cards = Card.query.filter_by(topic_id=topic_id, card_type=card_type).all()
-    else:
-        cards = Card.query.filter_by(topic_id=topic_id).all()
+    db.session.commit()
 
-    data = [c.to_dict() for c in cards]
-    return jsonify(data), 200
+    return jsonify(response), 201
 
 @app.route("/topics/<int:topic_id>/cards", methods=["GET"])
 def get_topic_cards(topic_id):
@@ -199,7 +282,7 @@ def get_topic_cards(topic_id):
     Get all cards for a specific topic.
     Optional: ?type=summary to filter by card_type.
     """
-    topic = Topic.query.get(topic_id)
+    topic = db.session.get(Topic, topic_id)
     if topic is None:
         return jsonify({"error": "Topic not found"}), 404
 
@@ -209,10 +292,7 @@ def get_topic_cards(topic_id):
 
     if card_type:
         if card_type not in VALID_CARD_TYPES:
-            return jsonify({
-                "error": "Invalid card_type",
-                "allowed_types": list(VALID_CARD_TYPES),
-            }), 400
+            return INVALID_CARD_TYPE_RESPONSE
         query = query.filter_by(card_type=card_type)
 
     cards = query.all()
@@ -230,17 +310,29 @@ def get_cards():
     """
     card_type = request.args.get("type")
 
-    query = Card.query
+    # select plain columns in CardOut field order, no ORM instances built
+    query = db.select(
+        Card.id, Card.topic_id, Card.card_type, Card.content, Card.created_at
+    )
     if card_type:
         if card_type not in VALID_CARD_TYPES:
-            return jsonify({
-                "error": "Invalid card_type",
-                "allowed_types": list(VALID_CARD_TYPES),
-            }), 400
-        query = query.filter_by(card_type=card_type)
+            return INVALID_CARD_TYPE_RESPONSE
+        query = query.where(Card.card_type == card_type)
 
-    cards = query.all()
-    return jsonify([c.to_dict() for c in cards]), 200
+    # stream the rows in chunks so memory stays bounded for large tables
+    result = db.session.execute(query.execution_options(yield_per=STREAM_CHUNK_SIZE))
+
+    def generate():
+        yield b"["
+        first = True
+        for partition in result.partitions():
+            # encode the partition as one array and drop its brackets
+            chunk = CARD_JSON_ENCODER.encode([CardOut(*row) for row in partition])[1:-1]
+            yield chunk if first else b"," + chunk
+            first = False
+        yield b"]"
+
+    return Response(stream_with_context(generate()), status=200, mimetype="application/json")
 
 
 @app.route("/cards/<int:card_id>", methods=["PUT"])
@@ -248,21 +340,18 @@ def update_card(card_id):
     """
     Update an existing card (card_type and/or content).
     """
-    card = Card.query.get(card_id)
+    card = db.session.get(Card, card_id)
     if card is None:
         return jsonify({"error": "Card not found"}), 404
 
-    data = request.get_json(silent=True) or {}
+    data = request.get_json(silent=True, cache=False) or {}
 
     new_card_type = data.get("card_type")
     new_content = data.get("content")
 
     if new_card_type is not None:
         if new_card_type not in VALID_CARD_TYPES:
-            return jsonify({
-                "error": "Invalid card_type",
-                "allowed_types": list(VALID_CARD_TYPES),
-            }), 400
+            return INVALID_CARD_TYPE_RESPONSE
         card.card_type = new_card_type
 
     if new_content is not None:
@@ -278,7 +367,7 @@ def delete_card(card_id):
     """
     Delete a card by ID.
     """
-    card = Card.query.get(card_id)
+    card = db.session.get(Card, card_id)
     if card is None:
         return jsonify({"error": "Card not found"}), 404
 
@@ -290,10 +379,30 @@ def delete_card(card_id):
 # --------------------------------------------------------------------------
 # App entrypoint
 # --------------------------------------------------------------------------
+#
+# Production (requires gunicorn + gevent):
+#   flask --app app init-db
+#   gunicorn -k gevent -w 4 --worker-connections 1000 app:app
+#
+# "python app.py" starts the Werkzeug dev server for local development only.
+
+def init_db() -> None:
+    """Create the SQLite tables and indexes if they don't exist yet."""
+    db.create_all()
+    # create_all skips existing tables, so add any missing indexes explicitly
+    for index in Card.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Create the database schema (run once before starting gunicorn)."""
+    init_db()
+    print("Database initialized.")
+
 
 if __name__ == "__main__":
-    # Create the SQLite tables if they don't exist yet
     with app.app_context():
-        db.create_all()
+        init_db()
 
     app.run(host="0.0.0.0", port=5000, debug=True)